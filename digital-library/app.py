@@ -1,14 +1,23 @@
 # app.py - Main Flask Application for Digital Library System
 # This is the core file that handles all routing, authentication, and business logic
 
-from flask import Flask, render_template, redirect, url_for, flash, request, session
+from flask import Flask, render_template, redirect, url_for, flash, request, session, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask_caching import Cache
+from flask_sqlalchemy.pagination import Pagination
 from werkzeug.utils import secure_filename
+from sqlalchemy import bindparam, column, event, exists, func, lambda_stmt, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, undefer
 from datetime import datetime, timedelta
-from models import db, User, Book, BorrowRecord
+from models import db, User, Book, BorrowRecord, create_book_search_index, hash_password, normalize_isbn
 from forms import RegistrationForm, LoginForm, BookForm, SearchForm
 from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
 import os
+import re
+import sqlite3
 
 # Initialize Flask application
 app = Flask(__name__)
@@ -19,10 +28,42 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///library.db'  # SQLite databas
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable modification tracking to save resources
 app.config['UPLOAD_FOLDER'] = 'static/images/book_covers'  # Folder for book cover images
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Max file size: 16MB
+app.config['ITEMS_PER_PAGE'] = 25  # Rows shown per page on list pages
+
+# Database connection pool settings (connections are reused across requests)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 20,  # Connections kept open in the pool
+    'max_overflow': 10,  # Extra connections allowed during bursts of traffic
+    'pool_pre_ping': True,  # Check a connection is alive before handing it out
+    'pool_recycle': 1800,  # Replace connections older than 30 minutes
+    'connect_args': {'check_same_thread': False}  # Allow pooled SQLite connections to move between threads
+}
+
+
+# Tune every new SQLite connection as it is opened
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Enable WAL journaling so readers are not blocked by a writer,
+    relax fsync to once per checkpoint and memory-map the database file
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA mmap_size=268435456')  # 256MB
+        cursor.close()
+
+# Cache settings (in-memory cache; use 'RedisCache' when running several processes)
+app.config['CACHE_TYPE'] = 'SimpleCache'
+app.config['CACHE_DEFAULT_TIMEOUT'] = 60
 
 # Initialize database with app
 db.init_app(app)
 
+# Initialize Flask-Caching for cached pages and query results
+cache = Cache(app)
+
 # Initialize Flask-Login for user session management
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -31,14 +72,42 @@ login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
 
+# Pre-built statements for the most frequent lookups
+# lambda_stmt caches the statement and its compiled SQL, so each call only binds new parameters
+user_by_id_stmt = lambda_stmt(lambda: select(User).where(User.id == bindparam('user_id')))
+book_by_id_stmt = lambda_stmt(lambda: select(Book).options(undefer(Book.description)).where(Book.id == bindparam('book_id')))
+borrow_record_by_id_stmt = lambda_stmt(lambda: select(BorrowRecord).where(BorrowRecord.id == bindparam('record_id')))
+active_borrow_exists_stmt = lambda_stmt(lambda: select(exists().where(
+    BorrowRecord.user_id == bindparam('user_id'),
+    BorrowRecord.book_id == bindparam('book_id'),
+    BorrowRecord.status == 'borrowed'
+)))
+
+
+def get_or_404(statement, **params):
+    """Run a pre-built lookup statement and return its row, or show the 404 page"""
+    result = db.session.execute(statement, params).scalar_one_or_none()
+    if result is None:
+        abort(404)
+    return result
+
+
 # User loader function for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
     """
     Load user from database by ID
     Required by Flask-Login to manage user sessions
+    Users are cached for a minute so most requests skip the SELECT
+    (Flask-Login itself keeps the loaded user for the rest of the request)
     """
-    return User.query.get(int(user_id))
+    cache_key = f'user:{user_id}'
+    user = cache.get(cache_key)
+    if user is None:
+        user = db.session.execute(user_by_id_stmt, {'user_id': int(user_id)}).scalar_one_or_none()
+        if user is not None:
+            cache.set(cache_key, user, timeout=60)
+    return user
 
 
 # Custom decorator to restrict access to librarians only
@@ -56,21 +125,117 @@ def librarian_required(f):
     return decorated_function
 
 
+# Cached pages must look the same for everyone who receives them
+def is_personalized_request():
+    """
+    Return True if the page will show user-specific content
+    (logged-in navigation or pending flash messages) and must not be cached
+    """
+    return current_user.is_authenticated or '_flashes' in session
+
+
+@cache.memoize(timeout=30)
+def library_stats():
+    """
+    Count books, students, borrowed and overdue records in one query
+    Cached for 30 seconds so dashboards don't recount on every page load
+    """
+    return tuple(db.session.execute(
+        select(
+            select(func.count(Book.id)).scalar_subquery(),
+            select(func.count(User.id)).where(User.role == 'student').scalar_subquery(),
+            select(func.count(BorrowRecord.id)).where(BorrowRecord.status == 'borrowed').scalar_subquery(),
+            select(func.count(BorrowRecord.id)).where(BorrowRecord.is_overdue).scalar_subquery()
+        )
+    ).one())
+
+
+def clear_index_cache():
+    """Drop the cached homepage and statistics so they are current"""
+    cache.delete('view//')
+    cache.delete_memoized(library_stats)
+
+
+# Search text made only of digits, hyphens and spaces is treated as a (partial) ISBN
+_ISBN_SEARCH_RE = re.compile(r'[\d\- ]*\d[\d\- ]*')
+
+
+def fts_match_query(search_query):
+    """
+    Turn free search text into an FTS5 prefix query
+    e.g. 'great gats' -> '"great"* "gats"*' (every word must match the start of a word)
+    """
+    words = re.findall(r'\w+', search_query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class CachedPagination(Pagination):
+    """
+    Pagination holding an already-fetched page of items and total count
+    Unlike a query's pagination it keeps no database query, so it can be stored in the cache
+    """
+    def _query_items(self):
+        return self._query_args['items']
+    
+    def _query_count(self):
+        return self._query_args['total']
+
+
+@cache.memoize(timeout=120)
+def search_books(search_query, category, page):
+    """
+    Return one page of books matching the search text and category
+    Results are cached per (search_query, category, page) so repeated searches skip the table scan
+    """
+    # Start with all books (as lightweight rows with only the displayed columns)
+    query = Book.list_view_query(with_excerpt=True)
+    
+    # Apply search filter if provided, using the full-text index on title/author/ISBN
+    match_query = fts_match_query(search_query)
+    if match_query:
+        matching_ids = text(
+            'SELECT rowid FROM book_fts WHERE book_fts MATCH :match_query'
+        ).bindparams(match_query=match_query).columns(column('rowid'))
+        query = query.filter(Book.id.in_(matching_ids))
+    elif search_query:
+        # Search text with no words in it (only punctuation) can't use the index
+        search_filter = f'%{search_query}%'
+        query = query.filter(
+            (Book.title.like(search_filter)) |
+            (Book.author.like(search_filter)) |
+            (Book.isbn.like(search_filter))
+        )
+    
+    # Apply category filter if provided
+    if category:
+        query = query.filter_by(category=category)
+    
+    pagination = query.order_by(Book.id.desc()).paginate(
+        page=page, per_page=app.config['ITEMS_PER_PAGE'], error_out=False
+    )
+    return CachedPagination(page=pagination.page, per_page=pagination.per_page, error_out=False,
+                            items=pagination.items, total=pagination.total)
+
+
+def clear_search_cache():
+    """Drop all cached search results after the catalog or availability changes"""
+    cache.delete_memoized(search_books)
+
+
 # ==================== HOME & AUTHENTICATION ROUTES ====================
 
 @app.route('/')
+@cache.cached(timeout=60, unless=is_personalized_request)
 def index():
     """
     Home page / Landing page
     Shows library features and recent books
     """
     # Get 6 most recently added books for display
-    recent_books = Book.query.order_by(Book.id.desc()).limit(6).all()
+    recent_books = Book.list_view_query(with_excerpt=True).order_by(Book.id.desc()).limit(6).all()
     
     # Get total statistics for homepage
-    total_books = Book.query.count()
-    total_users = User.query.filter_by(role='student').count()
-    total_borrowed = BorrowRecord.query.filter_by(status='borrowed').count()
+    total_books, total_users, total_borrowed, _ = library_stats()
     
     return render_template('index.html', 
                          recent_books=recent_books,
@@ -95,17 +260,21 @@ def register():
     
     # When form is submitted and valid
     if form.validate_on_submit():
+        # Hash password first (slow, CPU-bound) so the database work stays short
+        password_hash = hash_password(form.password.data)
+        
         # Create new user instance
         user = User(
             username=form.username.data,
             email=form.email.data,
-            role=form.role.data
+            role=form.role.data,
+            password=password_hash
         )
-        user.set_password(form.password.data)  # Hash password before saving
         
         # Add to database
         db.session.add(user)
         db.session.commit()
+        clear_index_cache()
         
         flash(f'Registration successful! Welcome {user.username}. Please log in.', 'success')
         return redirect(url_for('login'))
@@ -155,6 +324,7 @@ def logout():
     """
     Logout current user and destroy session
     """
+    cache.delete(f'user:{current_user.id}')
     logout_user()
     flash('You have been logged out successfully.', 'info')
     return redirect(url_for('index'))
@@ -172,25 +342,25 @@ def student_dashboard():
     if current_user.role != 'student':
         return redirect(url_for('librarian_dashboard'))
     
+    # Mark past-due borrows as overdue in a single UPDATE statement
+    if BorrowRecord.mark_overdue():
+        clear_index_cache()
+    
     # Get student's active borrows
-    active_borrows = BorrowRecord.query.filter_by(
+    active_borrows = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book)
+    ).filter_by(
         user_id=current_user.id, 
         status='borrowed'
     ).all()
     
-    # Update overdue status for active borrows
-    for borrow in active_borrows:
-        if borrow.is_overdue:
-            borrow.status = 'overdue'
-    db.session.commit()
-    
     # Get featured/available books (limit to 6)
-    available_books = Book.query.filter(Book.available_quantity > 0).limit(6).all()
+    available_books = Book.list_view_query().filter(Book.is_available).limit(6).all()
     
     # Count overdue books
-    overdue_count = BorrowRecord.query.filter_by(
-        user_id=current_user.id, 
-        status='overdue'
+    overdue_count = BorrowRecord.query.filter(
+        BorrowRecord.user_id == current_user.id,
+        BorrowRecord.is_overdue
     ).count()
     
     return render_template('student_dashboard.html',
@@ -207,28 +377,24 @@ def browse_books():
     """
     form = SearchForm(request.args, meta={'csrf': False})
     
-    # Start with all books
-    query = Book.query
-    
-    # Apply search filter if provided
     search_query = request.args.get('search_query', '').strip()
-    if search_query:
-        search_filter = f'%{search_query}%'
-        query = query.filter(
-            (Book.title.like(search_filter)) |
-            (Book.author.like(search_filter)) |
-            (Book.isbn.like(search_filter))
-        )
-    
-    # Apply category filter if provided
     category = request.args.get('category', '').strip()
-    if category:
-        query = query.filter_by(category=category)
+    page = request.args.get('page', 1, type=int)
+    
+    # Ignore unknown categories instead of running (and caching) a search that can't match
+    if category not in Book.VALID_CATEGORIES:
+        category = ''
     
-    # Get filtered books
-    books = query.all()
+    # ISBNs are stored without separators, so search for them the same way
+    if _ISBN_SEARCH_RE.fullmatch(search_query):
+        search_query = normalize_isbn(search_query)
     
-    return render_template('browse_books.html', books=books, form=form)
+    # Get one page of filtered books (cached per search)
+    pagination = search_books(search_query, category, page)
+    
+    return render_template('browse_books.html', books=pagination.items,
+                           pagination=pagination, form=form,
+                           categories=Book.CATEGORIES, category=category)
 
 
 @app.route('/book/<int:book_id>')
@@ -237,16 +403,14 @@ def book_details(book_id):
     """
     Show detailed information about a specific book
     """
-    book = Book.query.get_or_404(book_id)
+    book = get_or_404(book_by_id_stmt, book_id=book_id)
     
     # Check if current user has already borrowed this book
     user_has_borrowed = False
     if current_user.is_authenticated and current_user.role == 'student':
-        user_has_borrowed = BorrowRecord.query.filter_by(
-            user_id=current_user.id,
-            book_id=book_id,
-            status='borrowed'
-        ).first() is not None
+        user_has_borrowed = db.session.execute(
+            active_borrow_exists_stmt, {'user_id': current_user.id, 'book_id': book_id}
+        ).scalar()
     
     return render_template('book_details.html', book=book, user_has_borrowed=user_has_borrowed)
 
@@ -262,41 +426,38 @@ def borrow_book(book_id):
         flash('Only students can borrow books.', 'danger')
         return redirect(url_for('browse_books'))
     
-    book = Book.query.get_or_404(book_id)
+    book_title = db.session.query(Book.title).filter_by(id=book_id).scalar()
+    if book_title is None:
+        abort(404)
     
-    # Check if book is available
-    if book.available_quantity < 1:
+    if not Book.try_borrow(book_id):
         flash('Sorry, this book is currently not available.', 'warning')
         return redirect(url_for('book_details', book_id=book_id))
     
-    # Check if user already has this book borrowed
-    existing_borrow = BorrowRecord.query.filter_by(
-        user_id=current_user.id,
-        book_id=book_id,
-        status='borrowed'
-    ).first()
-    
-    if existing_borrow:
-        flash('You have already borrowed this book.', 'warning')
-        return redirect(url_for('book_details', book_id=book_id))
-    
     # Create new borrow record
+    borrow_date = datetime.utcnow()
+    due_date = borrow_date + timedelta(days=14)  # 14 days borrowing period
     borrow_record = BorrowRecord(
         user_id=current_user.id,
         book_id=book_id,
-        borrow_date=datetime.utcnow(),
-        due_date=datetime.utcnow() + timedelta(days=14),  # 14 days borrowing period
+        borrow_date=borrow_date,
+        due_date=due_date,
         status='borrowed'
     )
     
-    # Update book availability
-    book.available_quantity -= 1
-    
-    # Save to database
+    # Save to database; the unique index on active borrows rejects a second
+    # borrow of the same book, which also undoes the decrement above
     db.session.add(borrow_record)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('You have already borrowed this book.', 'warning')
+        return redirect(url_for('book_details', book_id=book_id))
+    clear_index_cache()
+    clear_search_cache()
     
-    flash(f'Successfully borrowed "{book.title}". Due date: {borrow_record.due_date.strftime("%B %d, %Y")}', 'success')
+    flash(f'Successfully borrowed "{book_title}". Due date: {due_date.strftime("%B %d, %Y")}', 'success')
     return redirect(url_for('my_books'))
 
 
@@ -311,25 +472,37 @@ def my_books():
         return redirect(url_for('librarian_dashboard'))
     
     # Get all borrow records for current user
-    active_borrows = BorrowRecord.query.filter_by(
+    # (book is joined in so the template doesn't lazy-load it per row)
+    active_borrows = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book)
+    ).filter_by(
         user_id=current_user.id,
         status='borrowed'
     ).order_by(BorrowRecord.borrow_date.desc()).all()
     
-    overdue_borrows = BorrowRecord.query.filter_by(
+    overdue_borrows = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book)
+    ).filter_by(
         user_id=current_user.id,
         status='overdue'
     ).order_by(BorrowRecord.due_date.asc()).all()
     
-    history = BorrowRecord.query.filter_by(
+    # Borrowing history grows without limit, so it is shown one page at a time
+    page = request.args.get('page', 1, type=int)
+    history_pagination = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book)
+    ).filter_by(
         user_id=current_user.id,
         status='returned'
-    ).order_by(BorrowRecord.return_date.desc()).all()
+    ).order_by(BorrowRecord.return_date.desc()).paginate(
+        page=page, per_page=app.config['ITEMS_PER_PAGE'], error_out=False
+    )
     
     return render_template('my_books.html',
                          active_borrows=active_borrows,
                          overdue_borrows=overdue_borrows,
-                         history=history)
+                         history=history_pagination.items,
+                         pagination=history_pagination)
 
 
 @app.route('/return/<int:record_id>', methods=['POST'])
@@ -339,7 +512,7 @@ def return_book(record_id):
     Return a borrowed book
     Updates borrow record and restores book availability
     """
-    borrow_record = BorrowRecord.query.get_or_404(record_id)
+    borrow_record = get_or_404(borrow_record_by_id_stmt, record_id=record_id)
     
     # Verify user owns this borrow record
     if borrow_record.user_id != current_user.id and current_user.role != 'librarian':
@@ -355,13 +528,18 @@ def return_book(record_id):
     borrow_record.return_date = datetime.utcnow()
     borrow_record.status = 'returned'
     
-    # Restore book availability
-    book = Book.query.get(borrow_record.book_id)
-    book.available_quantity += 1
+    # Restore book availability with a direct UPDATE (no need to load the book)
+    Book.query.filter_by(id=borrow_record.book_id).update(
+        {Book.available_quantity: Book.available_quantity + 1},
+        synchronize_session=False
+    )
+    book_title = db.session.query(Book.title).filter_by(id=borrow_record.book_id).scalar()
     
     db.session.commit()
+    clear_index_cache()
+    clear_search_cache()
     
-    flash(f'Successfully returned "{book.title}". Thank you!', 'success')
+    flash(f'Successfully returned "{book_title}". Thank you!', 'success')
     
     if current_user.role == 'librarian':
         return redirect(url_for('librarian_dashboard'))
@@ -378,26 +556,27 @@ def librarian_dashboard():
     Librarian dashboard
     Shows statistics, recent borrows, and overdue books
     """
+    # Mark past-due borrows as overdue in a single UPDATE statement
+    # (done first so the statistics and overdue list below are current)
+    if BorrowRecord.mark_overdue():
+        clear_index_cache()
+    
     # Get statistics
-    total_books = Book.query.count()
-    total_users = User.query.filter_by(role='student').count()
-    borrowed_books = BorrowRecord.query.filter_by(status='borrowed').count()
-    overdue_books = BorrowRecord.query.filter_by(status='overdue').count()
+    total_books, total_users, borrowed_books, overdue_books = library_stats()
     
-    # Get recent borrow records (last 10)
-    recent_borrows = BorrowRecord.query.order_by(
+    # Get recent borrow records (last 10) with their user and book
+    recent_borrows = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book),
+        joinedload(BorrowRecord.user)
+    ).order_by(
         BorrowRecord.borrow_date.desc()
     ).limit(10).all()
     
     # Get overdue records
-    overdue_records = BorrowRecord.query.filter_by(status='overdue').all()
-    
-    # Update overdue status
-    all_borrowed = BorrowRecord.query.filter_by(status='borrowed').all()
-    for record in all_borrowed:
-        if record.is_overdue:
-            record.status = 'overdue'
-    db.session.commit()
+    overdue_records = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book),
+        joinedload(BorrowRecord.user)
+    ).filter(BorrowRecord.is_overdue).all()
     
     return render_template('librarian_dashboard.html',
                          total_books=total_books,
@@ -415,8 +594,13 @@ def manage_books():
     """
     View all books in library (Librarian)
     """
-    books = Book.query.all()
-    return render_template('manage_books.html', books=books)
+    page = request.args.get('page', 1, type=int)
+    
+    # Lightweight rows with only the displayed columns, one page at a time
+    pagination = Book.list_view_query().order_by(Book.id.desc()).paginate(
+        page=page, per_page=app.config['ITEMS_PER_PAGE'], error_out=False
+    )
+    return render_template('manage_books.html', books=pagination.items, pagination=pagination)
 
 
 @app.route('/librarian/book/add', methods=['GET', 'POST'])
@@ -429,17 +613,11 @@ def add_book():
     form = BookForm()
     
     if form.validate_on_submit():
-        # Check if ISBN already exists
-        existing_book = Book.query.filter_by(isbn=form.isbn.data).first()
-        if existing_book:
-            flash('A book with this ISBN already exists.', 'danger')
-            return render_template('add_book.html', form=form)
-        
         # Create new book
         book = Book(
             title=form.title.data,
             author=form.author.data,
-            isbn=form.isbn.data,
+            isbn=normalize_isbn(form.isbn.data),
             category=form.category.data,
             description=form.description.data,
             quantity=form.quantity.data,
@@ -447,8 +625,16 @@ def add_book():
             publication_year=form.publication_year.data
         )
         
+        # Save to database; the unique index on ISBN rejects duplicates
         db.session.add(book)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('A book with this ISBN already exists.', 'danger')
+            return render_template('add_book.html', form=form)
+        clear_index_cache()
+        clear_search_cache()
         
         flash(f'Book "{book.title}" added successfully!', 'success')
         return redirect(url_for('manage_books'))
@@ -463,25 +649,33 @@ def edit_book(book_id):
     """
     Edit existing book (Librarian only)
     """
-    book = Book.query.get_or_404(book_id)
+    book = Book.query.options(undefer(Book.description)).get_or_404(book_id)
     form = BookForm(obj=book)
     
     if form.validate_on_submit():
         # Update book details
         book.title = form.title.data
         book.author = form.author.data
-        book.isbn = form.isbn.data
+        book.isbn = normalize_isbn(form.isbn.data)
         book.category = form.category.data
         book.description = form.description.data
         
         # Update quantity (maintain borrowed books)
-        borrowed_count = book.quantity - book.available_quantity
+        borrowed_count = book.current_out
         book.quantity = form.quantity.data
         book.available_quantity = form.quantity.data - borrowed_count
         
         book.publication_year = form.publication_year.data
         
-        db.session.commit()
+        # Save changes; the unique index on ISBN rejects another book's ISBN
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('A book with this ISBN already exists.', 'danger')
+            return render_template('edit_book.html', form=form, book=book)
+        clear_index_cache()
+        clear_search_cache()
         
         flash(f'Book "{book.title}" updated successfully!', 'success')
         return redirect(url_for('manage_books'))
@@ -499,18 +693,15 @@ def delete_book(book_id):
     """
     book = Book.query.get_or_404(book_id)
     
-    # Check if book has active borrows
-    active_borrows = BorrowRecord.query.filter_by(
-        book_id=book_id,
-        status='borrowed'
-    ).count()
-    
-    if active_borrows > 0:
+    # Check if book has active borrows (read from the book's copy counts, no COUNT query)
+    if book.current_out > 0:
         flash('Cannot delete book with active borrows. Please wait for returns.', 'danger')
         return redirect(url_for('manage_books'))
     
     db.session.delete(book)
     db.session.commit()
+    clear_index_cache()
+    clear_search_cache()
     
     flash(f'Book "{book.title}" deleted successfully.', 'success')
     return redirect(url_for('manage_books'))
@@ -525,15 +716,23 @@ def all_borrows():
     """
     # Get filter parameters
     status_filter = request.args.get('status', 'all')
+    page = request.args.get('page', 1, type=int)
     
-    query = BorrowRecord.query
+    # Join user and book up front; the table shows both for every row
+    query = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book),
+        joinedload(BorrowRecord.user)
+    )
     
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
     
-    borrows = query.order_by(BorrowRecord.borrow_date.desc()).all()
+    pagination = query.order_by(BorrowRecord.borrow_date.desc()).paginate(
+        page=page, per_page=app.config['ITEMS_PER_PAGE'], error_out=False
+    )
     
-    return render_template('all_borrows.html', borrows=borrows, status_filter=status_filter)
+    return render_template('all_borrows.html', borrows=pagination.items,
+                           pagination=pagination, status_filter=status_filter)
 
 
 # ==================== ERROR HANDLERS ====================
@@ -562,34 +761,43 @@ def init_db():
         # Create all tables
         db.create_all()
         
+        # Add any indexes missing from a database created by an older version
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        
+        # Create the full-text search index for books
+        create_book_search_index()
+        
         # Check if data already exists
         if User.query.first() is None:
             print("Creating sample data...")
             
-            # Create librarian account
-            librarian = User(
-                username='admin',
-                email='admin@library.com',
-                role='librarian'
-            )
-            librarian.set_password('admin123')
-            db.session.add(librarian)
-            
-            # Create sample students
-            students = [
-                {'username': 'john_doe', 'email': 'john@student.com', 'password': 'student123'},
-                {'username': 'jane_smith', 'email': 'jane@student.com', 'password': 'student123'},
-                {'username': 'bob_wilson', 'email': 'bob@student.com', 'password': 'student123'}
+            # Sample accounts: one librarian and three students
+            users = [
+                {'username': 'admin', 'email': 'admin@library.com', 'password': 'admin123', 'role': 'librarian'},
+                {'username': 'john_doe', 'email': 'john@student.com', 'password': 'student123', 'role': 'student'},
+                {'username': 'jane_smith', 'email': 'jane@student.com', 'password': 'student123', 'role': 'student'},
+                {'username': 'bob_wilson', 'email': 'bob@student.com', 'password': 'student123', 'role': 'student'}
             ]
             
-            for student_data in students:
-                student = User(
-                    username=student_data['username'],
-                    email=student_data['email'],
-                    role='student'
-                )
-                student.set_password(student_data['password'])
-                db.session.add(student)
+            # Hash all passwords in parallel (hashing is CPU-bound, one process per core)
+            with ProcessPoolExecutor() as executor:
+                password_hashes = list(executor.map(
+                    hash_password,
+                    [user_data['password'] for user_data in users]
+                ))
+            
+            # Insert all accounts in one batch
+            db.session.bulk_insert_mappings(User, [
+                {
+                    'username': user_data['username'],
+                    'email': user_data['email'],
+                    'role': user_data['role'],
+                    'password': password_hash
+                }
+                for user_data, password_hash in zip(users, password_hashes)
+            ])
             
             # Create sample books
             books = [
@@ -667,18 +875,8 @@ def init_db():
                 }
             ]
             
-            for book_data in books:
-                book = Book(
-                    title=book_data['title'],
-                    author=book_data['author'],
-                    isbn=book_data['isbn'],
-                    category=book_data['category'],
-                    description=book_data['description'],
-                    quantity=book_data['quantity'],
-                    available_quantity=book_data['quantity'],
-                    publication_year=book_data['publication_year']
-                )
-                db.session.add(book)
+            # Insert all books in one batch
+            Book.bulk_import(books)
             
             db.session.commit()
             print("Sample data created successfully!")
@@ -693,5 +891,6 @@ if __name__ == '__main__':
     # Initialize database on first run
     init_db()
     
-    # Run Flask application
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Run Flask application (threaded so one slow request doesn't block the others)
+    # For production use a WSGI server instead, e.g. `waitress-serve --threads=16 app:app`
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
@@ -4,10 +4,14 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SelectField, TextAreaField, IntegerField, SubmitField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, NumberRange
-from models import User, Book
+from sqlalchemy import or_
+from models import db, User, Book, normalize_isbn
 import re
 
 
+# Book categories as (value, label) pairs, shared by BookForm and SearchForm
+_BOOK_CATEGORIES = tuple((name, name) for name in Book.CATEGORIES)
+
 # Registration Form - For new user signup
 class RegistrationForm(FlaskForm):
     """
@@ -50,13 +54,28 @@ class RegistrationForm(FlaskForm):
     
     submit = SubmitField('Register')
     
+    def _taken_usernames_and_emails(self):
+        """
+        Look up the submitted username and email in a single query
+        The result is kept on the form, so validate_username and validate_email share it
+        """
+        if not hasattr(self, '_taken'):
+            rows = db.session.query(User.username, User.email).filter(
+                or_(User.username == self.username.data, User.email == self.email.data)
+            ).all()
+            self._taken = ({row.username for row in rows}, {row.email for row in rows})
+        return self._taken
+    
     def validate_username(self, username):
         """
         Custom validator to check if username already exists
         Raises ValidationError if username is taken
         """
-        user = User.query.filter_by(username=username.data).first()
-        if user:
+        # A username that already failed (e.g. too short) doesn't need a database lookup
+        if username.errors:
+            return
+        taken_usernames, _ = self._taken_usernames_and_emails()
+        if username.data in taken_usernames:
             raise ValidationError('Username already exists. Please choose a different one.')
     
     def validate_email(self, email):
@@ -64,8 +83,10 @@ class RegistrationForm(FlaskForm):
         Custom validator to check if email already exists
         Raises ValidationError if email is already registered
         """
-        user = User.query.filter_by(email=email.data).first()
-        if user:
+        if email.errors:
+            return
+        _, taken_emails = self._taken_usernames_and_emails()
+        if email.data in taken_emails:
             raise ValidationError('Email already registered. Please use a different email.')
 
 
@@ -121,20 +142,7 @@ class BookForm(FlaskForm):
                       ])
     
     category = SelectField('Category', 
-                          choices=[
-                              ('Fiction', 'Fiction'),
-                              ('Non-Fiction', 'Non-Fiction'),
-                              ('Science', 'Science'),
-                              ('Technology', 'Technology'),
-                              ('History', 'History'),
-                              ('Biography', 'Biography'),
-                              ('Mystery', 'Mystery'),
-                              ('Romance', 'Romance'),
-                              ('Fantasy', 'Fantasy'),
-                              ('Self-Help', 'Self-Help'),
-                              ('Business', 'Business'),
-                              ('Literature', 'Literature')
-                          ],
+                          choices=_BOOK_CATEGORIES,
                           validators=[DataRequired()])
     
     description = TextAreaField('Description', 
@@ -158,8 +166,11 @@ class BookForm(FlaskForm):
         Custom validator to check ISBN format and uniqueness
         ISBN should contain only digits and hyphens
         """
-        # Remove hyphens for validation
-        isbn_clean = isbn.data.replace('-', '').replace(' ', '')
+        if isbn.errors:
+            return
+        
+        # Remove hyphens and spaces for validation
+        isbn_clean = normalize_isbn(isbn.data)
         
         # Check if ISBN contains only digits
         if not isbn_clean.isdigit():
@@ -183,20 +194,6 @@ class SearchForm(FlaskForm):
                               validators=[Length(max=100)])
     
     category = SelectField('Category', 
-                          choices=[
-                              ('', 'All Categories'),
-                              ('Fiction', 'Fiction'),
-                              ('Non-Fiction', 'Non-Fiction'),
-                              ('Science', 'Science'),
-                              ('Technology', 'Technology'),
-                              ('History', 'History'),
-                              ('Biography', 'Biography'),
-                              ('Mystery', 'Mystery'),
-                              ('Romance', 'Romance'),
-                              ('Fantasy', 'Fantasy'),
-                              ('Self-Help', 'Self-Help'),
-                              ('Business', 'Business'),
-                              ('Literature', 'Literature')
-                          ])
+                          choices=(('', 'All Categories'),) + _BOOK_CATEGORIES)
     
     submit = SubmitField('Search')
@@ -1,14 +1,62 @@
 # models.py - Database Models for Digital Library System
 # This file defines the structure of our database tables and their relationships
 
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import joinedload
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
 from datetime import datetime
+import re
 
 # Initialize SQLAlchemy (will be configured in app.py)
 db = SQLAlchemy()
 
+# Argon2id password hasher (OWASP recommended settings: 19 MiB memory, 2 iterations)
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+
+def _now():
+    """
+    Current UTC time, read once per request so every record on a page
+    is compared against the same moment (falls back to a fresh reading outside requests)
+    """
+    if not has_request_context():
+        return datetime.utcnow()
+    if '_utcnow' not in g:
+        g._utcnow = datetime.utcnow()
+    return g._utcnow
+
+
+def _loaded(obj, name):
+    """
+    Value of an attribute if it's already loaded, otherwise '?'
+    Lets __repr__ describe expired or detached objects without querying the database
+    """
+    return obj.__dict__.get(name, '?')
+
+
+# Hyphens and spaces allowed between ISBN digits (compiled once, used on every book save)
+_ISBN_SEPARATOR_RE = re.compile(r'[- ]')
+
+
+def normalize_isbn(isbn):
+    """
+    Return an ISBN with its hyphens and spaces removed
+    Every ISBN is stored in this form, so the unique index catches the same book typed differently
+    """
+    return _ISBN_SEPARATOR_RE.sub('', isbn)
+
+
+def hash_password(password):
+    """Return the Argon2id hash of a password, ready to store in User.password"""
+    return password_hasher.hash(password)
+
 
 # User Model - Stores information about students and librarians
 class User(UserMixin, db.Model):
@@ -35,7 +83,7 @@ class User(UserMixin, db.Model):
     # User credentials and information
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password = db.Column(db.String(255), nullable=False)  # Will store hashed password
+    password = db.Column(db.String(128), nullable=False)  # Argon2id hash (~97 chars; older Werkzeug pbkdf2 hashes ~102)
     
     # User role: 'student' or 'librarian'
     role = db.Column(db.String(20), nullable=False, default='student')
@@ -45,26 +93,40 @@ class User(UserMixin, db.Model):
     
     # Relationship: One user can have many borrow records
     # backref creates a reverse relationship (borrow_record.user)
-    # lazy='dynamic' means the relationship will return a query object
-    borrow_records = db.relationship('BorrowRecord', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    # lazy='raise' blocks accidental per-row loading; use recent_borrows() or an explicit query
+    borrow_records = db.relationship('BorrowRecord', backref='user', lazy='raise', cascade='all, delete-orphan')
+    
+    def recent_borrows(self, limit=20):
+        """Return the user's most recent borrow records with their books loaded"""
+        return BorrowRecord.query.options(
+            joinedload(BorrowRecord.book)
+        ).filter_by(user_id=self.id).order_by(
+            BorrowRecord.borrow_date.desc()
+        ).limit(limit).all()
     
     def set_password(self, password):
         """
         Hash the password before storing it in database
         This ensures passwords are never stored in plain text
         """
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def check_password(self, password):
         """
         Verify if provided password matches the hashed password
         Returns True if password is correct, False otherwise
         """
-        return check_password_hash(self.password, password)
+        # Accounts created before the switch to Argon2 still have Werkzeug hashes
+        if not self.password.startswith('$argon2'):
+            return check_password_hash(self.password, password)
+        try:
+            return password_hasher.verify(self.password, password)
+        except (VerifyMismatchError, InvalidHashError):
+            return False
     
     def __repr__(self):
         """String representation of User object for debugging"""
-        return f'<User {self.username}>'
+        return f'<User {_loaded(self, "username")}>'
 
 
 # Book Model - Stores information about all books in the library
@@ -90,15 +152,24 @@ class Book(db.Model):
     """
     __tablename__ = 'books'
     
+    # Book categories in display order, and as a set for quick validity checks
+    CATEGORIES = (
+        'Fiction', 'Non-Fiction', 'Science', 'Technology', 'History', 'Biography',
+        'Mystery', 'Romance', 'Fantasy', 'Self-Help', 'Business', 'Literature',
+    )
+    VALID_CATEGORIES = frozenset(CATEGORIES)
+    
     # Primary Key
     id = db.Column(db.Integer, primary_key=True)
     
     # Book information
-    title = db.Column(db.String(200), nullable=False, index=True)
-    author = db.Column(db.String(100), nullable=False, index=True)
+    # title and author are searched through the book_fts full-text index (see below),
+    # so they don't carry B-tree indexes that no query could use
+    title = db.Column(db.String(200), nullable=False)
+    author = db.Column(db.String(100), nullable=False)
     isbn = db.Column(db.String(13), unique=True, nullable=False, index=True)
     category = db.Column(db.String(50), nullable=False, index=True)
-    description = db.Column(db.Text, nullable=True)
+    description = db.deferred(db.Column(db.Text, nullable=True))  # Only loaded when accessed
     cover_image = db.Column(db.String(200), nullable=True, default='default_book.jpg')
     
     # Quantity tracking
@@ -109,16 +180,93 @@ class Book(db.Model):
     publication_year = db.Column(db.Integer, nullable=True)
     
     # Relationship: One book can have many borrow records
-    borrow_records = db.relationship('BorrowRecord', backref='book', lazy='dynamic', cascade='all, delete-orphan')
+    # lazy='raise' blocks accidental per-row loading; use active_borrows() or an explicit query
+    borrow_records = db.relationship('BorrowRecord', backref='book', lazy='raise', cascade='all, delete-orphan')
     
-    @property
+    def active_borrows(self):
+        """Return the book's current (not returned) borrow records with their users loaded"""
+        return BorrowRecord.query.options(
+            joinedload(BorrowRecord.user)
+        ).filter(
+            BorrowRecord.book_id == self.id,
+            BorrowRecord.status != 'returned'
+        ).all()
+    
+    @hybrid_property
     def is_available(self):
-        """Check if book is available for borrowing"""
+        """
+        Check if book is available for borrowing
+        Works on a Book object and as a SQL condition, e.g. Book.query.filter(Book.is_available)
+        """
         return self.available_quantity > 0
     
+    @hybrid_property
+    def current_out(self):
+        """Number of copies currently borrowed (including overdue ones); also usable in queries"""
+        return self.quantity - self.available_quantity
+    
+    @classmethod
+    def try_borrow(cls, book_id):
+        """
+        Take one copy of a book if any are available
+        Checks and decrements in a single UPDATE, so two students can never both get the last copy.
+        Returns True if a copy was taken; the caller commits.
+        """
+        result = db.session.execute(
+            update(cls)
+            .where(cls.id == book_id, cls.is_available)
+            .values(available_quantity=cls.available_quantity - 1)
+        )
+        return result.rowcount == 1
+    
+    @classmethod
+    def bulk_import(cls, rows):
+        """
+        Add many books at once (e.g. a librarian's catalogue import or the sample data)
+        Rows are dicts with the BookForm fields. Rows with a malformed ISBN or unknown
+        category are skipped, and the whole batch goes to the database in one INSERT
+        that skips ISBNs already in the catalogue instead of querying for each one.
+        Returns the number of rows sent to the database; the caller commits.
+        """
+        books = []
+        for row in rows:
+            isbn = normalize_isbn(row['isbn'])
+            if not isbn.isdigit() or len(isbn) not in (10, 13) or row['category'] not in cls.VALID_CATEGORIES:
+                continue
+            books.append({
+                'title': row['title'],
+                'author': row['author'],
+                'isbn': isbn,
+                'category': row['category'],
+                'description': row.get('description') or '',
+                'quantity': row['quantity'],
+                'available_quantity': row['quantity'],  # Initially all copies are available
+                'publication_year': row.get('publication_year'),
+            })
+        
+        if books:
+            db.session.execute(sqlite_insert(cls).on_conflict_do_nothing(index_elements=['isbn']), books)
+        return len(books)
+    
+    @classmethod
+    def list_view_query(cls, with_excerpt=False):
+        """
+        Query for book list pages (cards and tables)
+        Returns lightweight rows with just the displayed columns instead of full Book objects.
+        with_excerpt adds the first 100 characters of the description, for pages whose cards show it
+        """
+        columns = [
+            cls.id, cls.title, cls.author, cls.isbn, cls.category, cls.publication_year,
+            cls.quantity, cls.available_quantity,
+            cls.is_available.label('is_available'),
+        ]
+        if with_excerpt:
+            columns.append(db.func.substr(cls.description, 1, 100).label('description'))
+        return db.session.query(*columns)
+    
     def __repr__(self):
         """String representation of Book object for debugging"""
-        return f'<Book {self.title}>'
+        return f'<Book {_loaded(self, "title")}>'
 
 
 # BorrowRecord Model - Tracks book borrowing transactions
@@ -141,6 +289,18 @@ class BorrowRecord(db.Model):
     """
     __tablename__ = 'borrow_records'
     
+    # Composite indexes matching the most common filters:
+    # a user's borrows by status, a book's borrows by status, and the overdue sweep
+    __table_args__ = (
+        db.Index('ix_borrow_user_status', 'user_id', 'status'),
+        db.Index('ix_borrow_book_status', 'book_id', 'status'),
+        db.Index('ix_borrow_status_due', 'status', 'due_date'),
+        # A student can hold at most one active borrow of the same book
+        db.Index('uq_borrow_active_user_book', 'user_id', 'book_id', unique=True,
+                 sqlite_where=db.text("status = 'borrowed'"),
+                 postgresql_where=db.text("status = 'borrowed'")),
+    )
+    
     # Primary Key
     id = db.Column(db.Integer, primary_key=True)
     
@@ -154,9 +314,9 @@ class BorrowRecord(db.Model):
     due_date = db.Column(db.DateTime, nullable=False)  # Calculated as borrow_date + 14 days
     
     # Status tracking: 'borrowed', 'returned', 'overdue'
-    status = db.Column(db.String(20), nullable=False, default='borrowed', index=True)
+    status = db.Column(db.String(20), nullable=False, default='borrowed')  # Indexed via ix_borrow_status_due
     
-    @property
+    @hybrid_property
     def is_overdue(self):
         """
         Check if book is overdue
@@ -164,14 +324,80 @@ class BorrowRecord(db.Model):
         """
         if self.status == 'returned':
             return False
-        return datetime.utcnow() > self.due_date
+        return _now() > self.due_date
+    
+    @is_overdue.expression
+    def is_overdue(cls):
+        """
+        Same check as a SQL condition, e.g. BorrowRecord.query.filter(BorrowRecord.is_overdue)
+        Lists the not-returned statuses (rather than status != 'returned') so SQLite can
+        seek ix_borrow_status_due instead of scanning the whole borrow history
+        """
+        return and_(cls.status.in_(('borrowed', 'overdue')), cls.due_date < _now())
+    
+    @classmethod
+    def mark_overdue(cls):
+        """
+        Set status to 'overdue' on every borrowed record past its due date
+        Runs as a single UPDATE statement and returns the number of records changed
+        """
+        result = db.session.execute(
+            update(cls)
+            .where(cls.status == 'borrowed', cls.due_date < _now())
+            .values(status='overdue')
+        )
+        db.session.commit()
+        return result.rowcount
     
     @property
     def days_until_due(self):
         """Calculate days until due date (negative if overdue)"""
-        delta = self.due_date - datetime.utcnow()
+        delta = self.due_date - _now()
         return delta.days
     
     def __repr__(self):
         """String representation of BorrowRecord object for debugging"""
-        return f'<BorrowRecord User:{self.user_id} Book:{self.book_id} Status:{self.status}>'
+        return (f'<BorrowRecord User:{_loaded(self, "user_id")} Book:{_loaded(self, "book_id")} '
+                f'Status:{_loaded(self, "status")}>')
+
+
+# Full-text search index for books (SQLite FTS5)
+# book_fts indexes title, author and ISBN of the books table so searches
+# can use an inverted index instead of scanning every row with LIKE '%...%'.
+# The triggers keep it in sync whenever a book is added, edited or deleted.
+BOOK_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS book_fts
+       USING fts5(title, author, isbn, content='books', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+           INSERT INTO book_fts(rowid, title, author, isbn)
+           VALUES (new.id, new.title, new.author, new.isbn);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+           INSERT INTO book_fts(book_fts, rowid, title, author, isbn)
+           VALUES ('delete', old.id, old.title, old.author, old.isbn);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author, isbn ON books BEGIN
+           INSERT INTO book_fts(book_fts, rowid, title, author, isbn)
+           VALUES ('delete', old.id, old.title, old.author, old.isbn);
+           INSERT INTO book_fts(rowid, title, author, isbn)
+           VALUES (new.id, new.title, new.author, new.isbn);
+       END""",
+]
+
+
+def create_book_search_index():
+    """
+    Create the book search table and its triggers if they don't exist yet
+    A newly created index is filled from the books already in the database
+    """
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_fts'")
+    ).first() is not None
+    
+    for statement in BOOK_SEARCH_DDL:
+        db.session.execute(text(statement))
+    
+    if not exists:
+        db.session.execute(text("INSERT INTO book_fts(book_fts) VALUES ('rebuild')"))
+    
+    db.session.commit()